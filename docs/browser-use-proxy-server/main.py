@@ -1,26 +1,90 @@
 import os
 import re
+import hmac
 import uuid
-import json
+import socket
 import shutil
+import zipfile
+import time
+import base64
 import asyncio
+import weakref
+from hashlib import blake2b, blake2s
 from pathlib import Path
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import quote_plus
+from typing import Optional, Dict, Any, List
 
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+import anyio
+import aiofiles
+import orjson
 
-load_dotenv()
 
-BRIDGE_API_KEY = os.getenv("BRIDGE_API_KEY")
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file='.env', extra='ignore')
+
+    bridge_api_key: Optional[str] = None
+    port: int = 8000
+    workers: Optional[int] = None
+    # when set, browser work is queued to Celery workers (see tasks.py) instead
+    # of running inside the API process
+    celery_broker_url: Optional[str] = None
+    screenshot_quality: int = 60
+    # sessions keep refreshing their live-view screenshot for this long, or
+    # until they are completed
+    session_live_seconds: int = 120
+    live_interval: float = 1.0
+    # how long /sessions/{sid}/complete waits for the session's browser to close
+    session_close_timeout: float = 30.0
+    # internal nginx location aliased to the app directory; when set,
+    # screenshots are served by nginx via X-Accel-Redirect
+    accel_redirect_prefix: str = ''
+    # 0 picks a free port per process, so Celery's prefork children (each
+    # with its own Chromium) don't fight over one fixed port
+    cdp_port: int = 0
+    browser_cdp_url: Optional[str] = None
+    bu_pool_size: int = 8
+    profile_ctx_size: int = 4
+    profile_ctx_ttl: float = 300.0
+    # caps concurrent browser work per process
+    max_browsers: int = Field(default_factory=lambda: max(1, (os.cpu_count() or 2) // 2))
+    # runs accepted but not yet finished; beyond this, new work gets a 429
+    queue_limit: int = 32
+    # live sessions have their own budget, so a session idling in its live
+    # view doesn't hold a browser slot that /run-task needs
+    max_sessions: int = 4
+    # /run-tasks: tasks per batch, and tabs open at once within the batch's context
+    max_batch: int = 20
+    batch_tabs: int = 4
+
+
+@lru_cache
+def settings() -> Settings:
+    return Settings()
+
+
+CELERY_BROKER_URL = settings().celery_broker_url
 RUNS_DIR = Path("./runs")
 SESSIONS_DIR = Path("./sessions")
 PROFILES_DIR = Path("./profiles")
 RUNS_DIR.mkdir(parents=True, exist_ok=True)
 SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
 PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+# screenshots are viewport-only JPEGs; PNG was several times larger for the
+# same live-view quality
+SCREENSHOT_NAME = 'screenshot.jpg'
+SCREENSHOT_QUALITY = settings().screenshot_quality
+SESSION_LIVE_SECONDS = settings().session_live_seconds
+LIVE_INTERVAL = settings().live_interval
+SESSION_CLOSE_TIMEOUT = settings().session_close_timeout
+ACCEL_REDIRECT_PREFIX = settings().accel_redirect_prefix.rstrip('/')
 
 app = FastAPI(title="Browser-Use Bridge")
 
@@ -39,16 +103,430 @@ try:
 except Exception:
     HAVE_PLAYWRIGHT = False
 
+# Process-wide browser pool: one Chromium serves every task through its own
+# context (with a per-context proxy), so browser processes no longer scale with
+# the number of sessions. The browser exposes a CDP endpoint that browser_use
+# attaches to as well; set BROWSER_CDP_URL to share an externally run Chromium.
+CHROMIUM_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+CDP_PORT = settings().cdp_port
+CDP_URL = settings().browser_cdp_url
+CDP_EXTERNAL = bool(CDP_URL)
+PW = None
+SHARED_BROWSER = None
+# bumped whenever the shared Chromium is (re)launched or reconnected, so
+# browser_use clients attached to an older one get rebuilt
+_SHARED_GEN = 0
+_BU_SHARED_GEN = None
+# browser_use browsers that need their own launch (proxy or saved profile),
+# least recently used first; idle ones beyond BU_POOL_SIZE are stopped
+BU_POOL: 'OrderedDict[tuple, Any]' = OrderedDict()
+BU_ACTIVE: Dict[tuple, int] = {}
+BU_POOL_SIZE = settings().bu_pool_size
+# persistent contexts for saved profiles (profile_id -> (context, proxy key,
+# last used)); idle ones are closed past PROFILE_CTX_SIZE or PROFILE_CTX_TTL
+PROFILE_CTX: 'OrderedDict[str, tuple]' = OrderedDict()
+PROFILE_ACTIVE: Dict[str, int] = {}
+PROFILE_CTX_SIZE = settings().profile_ctx_size
+PROFILE_CTX_TTL = settings().profile_ctx_ttl
+# Celery's prefork children can't see each other's pools, and a profile's
+# next task may land on another child, so workers close a profile's browser
+# after every task instead of keeping it warm
+WARM_PROFILES = not CELERY_BROKER_URL
+# _POOL_LOCK only guards the pool bookkeeping and is never held across a
+# launch; launches and closes are serialized per browser key / user data dir
+# instead, so a slow profile launch doesn't stall the shared browser
+_POOL_LOCK = asyncio.Lock()
+_SHARED_LOCK = asyncio.Lock()
+_PW_LOCK = asyncio.Lock()
+_LAUNCH_LOCKS: 'weakref.WeakValueDictionary[tuple, asyncio.Lock]' = weakref.WeakValueDictionary()
+# evicted browsers still shutting down, by launch key; a relaunch waits for them
+_CLOSING: Dict[tuple, asyncio.Task] = {}
+_SWEEPER: Optional[asyncio.Task] = None
+# excess tasks wait in 'waiting_for_slot'
+MAX_BROWSERS = settings().max_browsers
+BROWSER_SEM = asyncio.Semaphore(MAX_BROWSERS)
+QUEUE_LIMIT = settings().queue_limit
+_queue_limit = None
+MAX_SESSIONS = settings().max_sessions
+_session_limit = None
+MAX_BATCH = settings().max_batch
+BATCH_TABS = settings().batch_tabs
+
+
+def _proxy_key(proxy: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    if not proxy:
+        return None
+    return (proxy.get('server'), proxy.get('username'), proxy.get('password'))
+
+
+def _playwright_proxy(proxy_key: Optional[tuple]) -> Optional[Dict[str, str]]:
+    if not proxy_key:
+        return None
+    server, username, password = proxy_key
+    # playwright expects proxy dict with server, username, password
+    proxy_kw = {'server': server}
+    if username:
+        proxy_kw['username'] = username
+    if password:
+        proxy_kw['password'] = password
+    return proxy_kw
+
+
+def _launch_lock(lock_key: tuple) -> asyncio.Lock:
+    lock = _LAUNCH_LOCKS.get(lock_key)
+    if lock is None:
+        lock = _LAUNCH_LOCKS[lock_key] = asyncio.Lock()
+    return lock
+
+
+def _dir_key(user_data_dir) -> tuple:
+    # one Chromium per user data dir, whichever backend opens it
+    return ('dir', str(user_data_dir))
+
+
+def _close_later(lock_key: tuple, closer) -> asyncio.Task:
+    """Close an evicted browser or context in the background."""
+    async def _run():
+        try:
+            await closer()
+        except Exception:
+            pass
+
+    task = asyncio.ensure_future(_run())
+    _CLOSING[lock_key] = task
+
+    def _done(t, lock_key=lock_key):
+        if _CLOSING.get(lock_key) is t:
+            del _CLOSING[lock_key]
+
+    task.add_done_callback(_done)
+    return task
+
+
+async def _wait_closed(lock_key: tuple):
+    task = _CLOSING.get(lock_key)
+    if task is not None:
+        await asyncio.shield(task)
+
+
+async def _playwright():
+    global PW
+    async with _PW_LOCK:
+        if PW is None:
+            PW = await async_playwright().start()
+        return PW
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def get_browser():
+    """Return the shared Chromium, launching it (or connecting over CDP) on first use."""
+    global SHARED_BROWSER, CDP_URL, _SHARED_GEN
+    async with _SHARED_LOCK:
+        if SHARED_BROWSER is not None and SHARED_BROWSER.is_connected():
+            return SHARED_BROWSER
+        pw = await _playwright()
+        if CDP_EXTERNAL:
+            SHARED_BROWSER = await pw.chromium.connect_over_cdp(CDP_URL)
+        else:
+            port = CDP_PORT or _free_port()
+            SHARED_BROWSER = await pw.chromium.launch(
+                headless=True,
+                args=CHROMIUM_ARGS + [f'--remote-debugging-port={port}'],
+            )
+            CDP_URL = f'http://127.0.0.1:{port}'
+        _SHARED_GEN += 1
+        return SHARED_BROWSER
+
+
+@lru_cache(maxsize=32)
+def _make_profile(proxy_key: Optional[tuple], user_data_dir: Optional[str]):
+    profile_kwargs = {}
+    if proxy_key:
+        server, username, password = proxy_key
+        profile_kwargs['proxy'] = ProxySettings(server=server, username=username, password=password)
+    if user_data_dir:
+        # BU_POOL keeps the browser warm between tasks; keep_alive stays off
+        # so stop() on eviction or shutdown really ends Chromium
+        profile_kwargs['user_data_dir'] = user_data_dir
+    return BrowserProfile(**profile_kwargs) if profile_kwargs else None
+
+
+def _bu_lock_key(key: tuple) -> tuple:
+    _proxy_key, user_data_dir, _headless = key
+    return _dir_key(user_data_dir) if user_data_dir else ('bu', key)
+
+
+def _evict_idle_bu(keep: tuple):
+    for key in list(BU_POOL):
+        if len(BU_POOL) <= BU_POOL_SIZE:
+            break
+        if key != keep and not BU_ACTIVE.get(key):
+            _close_later(_bu_lock_key(key), BU_POOL.pop(key).stop)
+
+
+@asynccontextmanager
+async def use_bu_browser(proxy_key: Optional[tuple], user_data_dir: Optional[str], headless: bool = True):
+    """Yield a cached browser_use Browser; tasks open their own page on it."""
+    global _BU_SHARED_GEN
+    key = (proxy_key, user_data_dir, headless)
+    lock_key = _bu_lock_key(key)
+    # a proxy or saved profile must be applied at launch, everything else
+    # attaches to the shared Chromium
+    shared = not proxy_key and not user_data_dir and headless and (CDP_URL or HAVE_PLAYWRIGHT)
+    if shared and HAVE_PLAYWRIGHT:
+        # relaunches the shared Chromium if it died, possibly on a new port
+        await get_browser()
+    async with _launch_lock(lock_key):
+        stale = []
+        async with _POOL_LOCK:
+            browser = BU_POOL.get(key)
+            if browser is not None and shared and _BU_SHARED_GEN != _SHARED_GEN:
+                # attached to a Chromium that has since gone away
+                stale = [BU_POOL.pop(key)]
+                browser = None
+            if browser is not None:
+                BU_POOL.move_to_end(key)
+                BU_ACTIVE[key] = BU_ACTIVE.get(key, 0) + 1
+            elif user_data_dir:
+                # same profile under another proxy: a user data dir can only be
+                # opened once, so relaunch if nobody is using the other browser
+                others = [k for k in BU_POOL if k[1] == user_data_dir]
+                if any(BU_ACTIVE.get(k) for k in others):
+                    raise RuntimeError('profile is in use with a different proxy')
+                stale = [BU_POOL.pop(k) for k in others]
+        if browser is None:
+            for old in stale:
+                try:
+                    await old.stop()
+                except Exception:
+                    pass
+            await _wait_closed(lock_key)
+            if shared:
+                gen = _SHARED_GEN
+                browser = Browser(cdp_url=CDP_URL)
+            else:
+                browser = Browser(headless=headless, browser_profile=_make_profile(proxy_key, user_data_dir))
+            await browser.start()
+            async with _POOL_LOCK:
+                BU_POOL[key] = browser
+                BU_ACTIVE[key] = BU_ACTIVE.get(key, 0) + 1
+                if shared:
+                    _BU_SHARED_GEN = gen
+                _evict_idle_bu(key)
+    try:
+        yield browser
+    finally:
+        BU_ACTIVE[key] -= 1
+        if not BU_ACTIVE[key]:
+            del BU_ACTIVE[key]
+        if user_data_dir and not WARM_PROFILES and not BU_ACTIVE.get(key):
+            async with _launch_lock(lock_key):
+                async with _POOL_LOCK:
+                    stale = BU_POOL.pop(key, None)
+                if stale is not None:
+                    try:
+                        await stale.stop()
+                    except Exception:
+                        pass
+
+
+@asynccontextmanager
+async def _shared_context(proxy_key: Optional[tuple]):
+    browser = await get_browser()
+    context = await browser.new_context(proxy=_playwright_proxy(proxy_key), accept_downloads=True)
+    try:
+        yield context
+    finally:
+        # close only the context; the browser stays in the pool
+        await context.close()
+
+
+def _persistent_kwargs(proxy_key: Optional[tuple]) -> Dict[str, Any]:
+    launch_kwargs = {'headless': True, 'args': CHROMIUM_ARGS, 'accept_downloads': True}
+    proxy_kw = _playwright_proxy(proxy_key)
+    if proxy_kw:
+        launch_kwargs['proxy'] = proxy_kw
+    return launch_kwargs
+
+
+def _evict_idle_profiles(keep: Optional[str]):
+    now = time.monotonic()
+    for profile_id, (context, _proxy_key, last_used) in list(PROFILE_CTX.items()):
+        if profile_id == keep or PROFILE_ACTIVE.get(profile_id):
+            continue
+        if len(PROFILE_CTX) > PROFILE_CTX_SIZE or now - last_used > PROFILE_CTX_TTL:
+            del PROFILE_CTX[profile_id]
+            _close_later(_dir_key(PROFILES_DIR / profile_id), context.close)
+
+
+@asynccontextmanager
+async def use_profile_context(profile_id: str, profile_dir: Path, proxy_key: Optional[tuple]):
+    """Yield a persistent context on the saved profile, kept warm between tasks."""
+    lock_key = _dir_key(profile_dir)
+    async with _launch_lock(lock_key):
+        stale = None
+        async with _POOL_LOCK:
+            entry = PROFILE_CTX.get(profile_id)
+            if entry is not None and entry[1] != proxy_key:
+                # the proxy is fixed at launch and a user data dir can only be
+                # opened once, so relaunch if nobody is using it
+                if PROFILE_ACTIVE.get(profile_id):
+                    raise RuntimeError('profile is in use with a different proxy')
+                stale = PROFILE_CTX.pop(profile_id)[0]
+                entry = None
+            if entry is not None:
+                PROFILE_CTX[profile_id] = (entry[0], proxy_key, time.monotonic())
+                PROFILE_CTX.move_to_end(profile_id)
+                PROFILE_ACTIVE[profile_id] = PROFILE_ACTIVE.get(profile_id, 0) + 1
+                _evict_idle_profiles(profile_id)
+        if entry is not None:
+            context = entry[0]
+        else:
+            if stale is not None:
+                try:
+                    await stale.close()
+                except Exception:
+                    pass
+            await _wait_closed(lock_key)
+            pw = await _playwright()
+            context = await pw.chromium.launch_persistent_context(str(profile_dir), **_persistent_kwargs(proxy_key))
+
+            def _forget(_ctx, profile_id=profile_id, context=context):
+                # drop the cache entry if the browser goes away underneath us
+                if PROFILE_CTX.get(profile_id, (None,))[0] is context:
+                    del PROFILE_CTX[profile_id]
+
+            context.on('close', _forget)
+            async with _POOL_LOCK:
+                PROFILE_CTX[profile_id] = (context, proxy_key, time.monotonic())
+                PROFILE_ACTIVE[profile_id] = PROFILE_ACTIVE.get(profile_id, 0) + 1
+                _evict_idle_profiles(profile_id)
+    try:
+        yield context
+    finally:
+        PROFILE_ACTIVE[profile_id] -= 1
+        if not PROFILE_ACTIVE[profile_id]:
+            del PROFILE_ACTIVE[profile_id]
+        if profile_id in PROFILE_CTX:
+            PROFILE_CTX[profile_id] = (context, proxy_key, time.monotonic())
+        if not WARM_PROFILES and not PROFILE_ACTIVE.get(profile_id):
+            async with _launch_lock(lock_key):
+                async with _POOL_LOCK:
+                    entry = PROFILE_CTX.pop(profile_id, None)
+                if entry is not None:
+                    try:
+                        await entry[0].close()
+                    except Exception:
+                        pass
+
+
+@asynccontextmanager
+async def session_context(user_data_dir: Path, proxy_key: Optional[tuple]):
+    """Yield a persistent context on a session's own user data dir, closed on exit."""
+    pw = await _playwright()
+    context = await pw.chromium.launch_persistent_context(str(user_data_dir), **_persistent_kwargs(proxy_key))
+    try:
+        yield context
+    finally:
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+
+@asynccontextmanager
+async def session_bu_browser(proxy_key: Optional[tuple], user_data_dir: Path):
+    """Yield a browser_use Browser of its own on a session's user data dir, stopped on exit."""
+    browser = Browser(headless=True, browser_profile=_make_profile(proxy_key, str(user_data_dir)))
+    await browser.start()
+    try:
+        yield browser
+    finally:
+        try:
+            await browser.stop()
+        except Exception:
+            pass
+
+
+async def _sweep_profiles():
+    # close profile contexts that sat idle past the TTL even when no new
+    # task comes along to evict them
+    while True:
+        await asyncio.sleep(max(PROFILE_CTX_TTL / 4, 1.0))
+        async with _POOL_LOCK:
+            _evict_idle_profiles(None)
+
+
+def start_sweeper():
+    global _SWEEPER
+    if _SWEEPER is None:
+        _SWEEPER = asyncio.get_running_loop().create_task(_sweep_profiles())
+
+
+@app.on_event("startup")
+async def _warm_pool():
+    # start the Playwright driver and shared Chromium before the first request;
+    # with Celery the workers own the browser, so the API process skips this
+    if not HAVE_PLAYWRIGHT or CELERY_BROKER_URL:
+        return
+    start_sweeper()
+    try:
+        await get_browser()
+    except Exception:
+        # tasks retry the launch and report the error in their status
+        pass
+
+
+@app.on_event("shutdown")
+async def _close_pool():
+    global PW, SHARED_BROWSER, _SWEEPER
+    if _SWEEPER is not None:
+        _SWEEPER.cancel()
+        _SWEEPER = None
+    for browser in list(BU_POOL.values()):
+        try:
+            await browser.stop()
+        except Exception:
+            pass
+    BU_POOL.clear()
+    for context, _proxy_key, _last_used in list(PROFILE_CTX.values()):
+        try:
+            await context.close()
+        except Exception:
+            pass
+    PROFILE_CTX.clear()
+    if _CLOSING:
+        await asyncio.gather(*list(_CLOSING.values()), return_exceptions=True)
+    if SHARED_BROWSER is not None:
+        try:
+            await SHARED_BROWSER.close()
+        except Exception:
+            pass
+        SHARED_BROWSER = None
+    if PW is not None:
+        try:
+            await PW.stop()
+        except Exception:
+            pass
+        PW = None
+
 
 def check_auth(request: Request):
-    if not BRIDGE_API_KEY:
+    api_key = settings().bridge_api_key
+    if not api_key:
         # no auth configured, allow
         return
     auth = request.headers.get("Authorization")
     if not auth or not auth.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     token = auth.split(" ", 1)[1].strip()
-    if token != BRIDGE_API_KEY:
+    # constant-time compare so response timing doesn't leak the key
+    if not hmac.compare_digest(token.encode(), api_key.encode()):
         raise HTTPException(status_code=401, detail="Invalid API key")
 
 
@@ -64,6 +542,11 @@ class RunTaskRequest(BaseModel):
     proxy: Optional[ProxyModel] = None
 
 
+class BatchRequest(BaseModel):
+    tasks: List[str]
+    proxy: Optional[ProxyModel] = None
+
+
 @app.post("/health")
 async def health(req: Request):
     try:
@@ -74,157 +557,344 @@ async def health(req: Request):
     return JSONResponse({"status": "ok"})
 
 
+# bounded, compiled once; task text is untrusted
+_URL_RE = re.compile(r"https?://[^\s<>\"']{1,2048}")
+
+
 def _extract_first_url(text: str) -> Optional[str]:
-    m = re.search(r"https?://[\w-.~:/?#\[\]@!$&'()*+,;=%]+", text)
+    m = _URL_RE.search(text)
     if m:
         return m.group(0)
     return None
 
 
-async def _run_browser_task(task: str, outdir: Path, profile_id: Optional[str], proxy: Optional[Dict[str, Any]]):
-    status_file = outdir / "status.json"
-
-    def write_status(s: Dict[str, Any]):
-        try:
-            with open(status_file, 'w', encoding='utf-8') as f:
-                json.dump(s, f, indent=2)
-        except Exception:
-            pass
+# Runs that are queued or running, by idempotency key (Idempotency-Key header or
+# a hash of task, profile and proxy), so retries don't launch duplicate work.
+INFLIGHT: Dict[str, str] = {}
+_INFLIGHT_LOCK = asyncio.Lock()
+# with Celery the worker can't pop finished runs, so the API sweeps them
+# out whenever the map grows past this
+INFLIGHT_SWEEP_AT = 256
+_inflight_sweep_at = INFLIGHT_SWEEP_AT
+TERMINAL_STATES = ('finished', 'error')
 
-    write_status({'status': 'starting', 'task': task})
 
+def _target_url(task: str) -> str:
     # Determine URL to visit
     url = _extract_first_url(task)
     if not url:
         # perform search via DuckDuckGo when no explicit URL
         q = task.replace('"', '')
-        url = f"https://duckduckgo.com/?q={q}".replace(' ', '+')
+        url = f"https://duckduckgo.com/?q={quote_plus(q)}"
+    return url
+
+
+def _write_status(outdir: Path, s: Dict[str, Any], log: bool = True):
+    """Atomically replace status.json and, for state changes, append to events.ndjson."""
+    data = orjson.dumps(s)
+    status_file = outdir / 'status.json'
+    tmp = status_file.with_suffix('.tmp')
+    tmp.write_bytes(data)
+    # readers see either the old or the new file, never a partial write
+    os.replace(tmp, status_file)
+    if log:
+        with open(outdir / 'events.ndjson', 'ab') as f:
+            f.write(data + b'\n')
+
+
+async def _screenshot_bytes(page) -> Optional[bytes]:
+    # Playwright pages take type=/full_page=, browser_use pages take format= and
+    # return base64; try each signature in turn
+    for kwargs in (
+        {'type': 'jpeg', 'quality': SCREENSHOT_QUALITY, 'full_page': False},
+        {'format': 'jpeg', 'quality': SCREENSHOT_QUALITY},
+        {},
+    ):
+        try:
+            data = await page.screenshot(**kwargs)
+            break
+        except TypeError:
+            continue
+    else:
+        return None
+    if isinstance(data, str):
+        if data.startswith('data:'):
+            data = data.split(',', 1)[1]
+        data = base64.b64decode(data)
+    return bytes(data) if data else None
+
+
+async def _capture(page, screenshot_path: Path, last_hash: Optional[bytes] = None) -> Optional[bytes]:
+    """Save a viewport screenshot unless it is identical to last_hash; returns the current hash."""
+    try:
+        data = await _screenshot_bytes(page)
+        if not data:
+            return last_hash
+        h = blake2s(data, digest_size=8).digest()
+        if h == last_hash:
+            return last_hash
+        tmp = screenshot_path.with_suffix('.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, screenshot_path)
+        return h
+    except Exception:
+        return last_hash
+
+
+async def _live_view(page, outdir: Path, screenshot_path: Path, url: str, live_seconds: int, write_status):
+    last_hash = await _capture(page, screenshot_path)
+    deadline = time.monotonic() + live_seconds
+    logged = False
+    while time.monotonic() < deadline and not (outdir / 'completed').exists():
+        await asyncio.sleep(LIVE_INTERVAL)
+        # unchanged frames only bump last_seen_ts
+        last_hash = await _capture(page, screenshot_path, last_hash)
+        # only the switch to 'live' goes to the event log, later ticks just
+        # refresh last_seen_ts in status.json
+        write_status({'status': 'live', 'target_url': url, 'last_seen_ts': time.time()}, log=not logged)
+        logged = True
+
+
+async def _run_browser_task(task: str, outdir: Path, profile_id: Optional[str], proxy: Optional[Dict[str, Any]], inflight_key: Optional[str] = None, live_seconds: int = 0):
+    def write_status(s: Dict[str, Any], log: bool = True):
+        try:
+            _write_status(outdir, s, log)
+        except Exception:
+            pass
+        if inflight_key and s.get('status') in TERMINAL_STATES and INFLIGHT.get(inflight_key) == outdir.name:
+            INFLIGHT.pop(inflight_key, None)
+
+    write_status({'status': 'starting', 'task': task})
 
-    write_status({'status': 'launching_browser', 'target_url': url})
+    url = _target_url(task)
 
-    # prepare profile dir
+    # prepare profile dir; the parent already exists, so only the leaf is created
     profile_dir = None
+    session_dir = None
     if profile_id:
         profile_dir = PROFILES_DIR / profile_id
-        profile_dir.mkdir(parents=True, exist_ok=True)
-    else:
-        profile_dir = outdir / 'profile'
-        profile_dir.mkdir(parents=True, exist_ok=True)
+        os.makedirs(profile_dir, exist_ok=True)
+    elif live_seconds:
+        # a session without a saved profile browses in its own user data dir,
+        # which /sessions/{sid}/complete turns into a profile
+        session_dir = outdir / 'profile'
+        os.makedirs(session_dir, exist_ok=True)
 
-    screenshot_path = outdir / 'screenshot.png'
+    screenshot_path = outdir / SCREENSHOT_NAME
 
-    # Use browser_use if available
-    if HAVE_BROWSER_USE:
-        try:
-            bp = None
-            if proxy:
-                bp = BrowserProfile(proxy=ProxySettings(
-                    server=proxy.get('server'),
-                    username=proxy.get('username'),
-                    password=proxy.get('password')
-                ))
-            # ensure user_data_dir if supported
-            try:
-                bp.user_data_dir = str(profile_dir)
-            except Exception:
-                try:
-                    bp = BrowserProfile(
-                        user_data_dir=str(profile_dir),
-                        proxy=(bp.proxy if bp else None)
-                    )
-                except Exception:
-                    bp = bp
+    proxy_key = _proxy_key(proxy)
 
-            browser = Browser(headless=True, browser_profile=bp)
-            await browser.start()
-            page = await browser.new_page()
-            await page.goto(url)
-            # small wait for network
-            await asyncio.sleep(2)
+    if live_seconds:
+        # sessions are bounded by MAX_SESSIONS instead; holding a browser slot
+        # through the whole live view would starve /run-task on small hosts
+        slot = nullcontext()
+    else:
+        # wait for a free browser slot instead of overcommitting the host
+        write_status({'status': 'waiting_for_slot', 'target_url': url})
+        slot = BROWSER_SEM
+    async with slot:
+        write_status({'status': 'launching_browser', 'target_url': url})
+
+        # Use browser_use if available
+        if HAVE_BROWSER_USE:
             try:
-                data = await page.screenshot()
-                if isinstance(data, (bytes, bytearray)):
-                    with open(screenshot_path, 'wb') as f:
-                        f.write(data)
-                elif isinstance(data, str):
-                    import base64
-                    s = data
-                    if s.startswith('data:'):
-                        s = s.split(',', 1)[1]
+                if session_dir is not None:
+                    browsers = session_bu_browser(proxy_key, session_dir)
+                else:
+                    # only saved profiles get a dedicated browser; ad-hoc runs share one
+                    browsers = use_bu_browser(proxy_key, str(profile_dir) if profile_dir else None)
+                async with browsers as browser:
+                    page = await browser.new_page()
                     try:
-                        b = base64.b64decode(s)
-                        with open(screenshot_path, 'wb') as f:
-                            f.write(b)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-            write_status({'status': 'finished', 'screenshot': str(screenshot_path)})
-            try:
-                await browser.stop()
-            except Exception:
-                pass
-            return
-        except Exception as e:
-            write_status({'status': 'error', 'error': str(e)})
-            return
+                        await page.goto(url)
+                        # small wait for network
+                        await asyncio.sleep(2)
+                        await _live_view(page, outdir, screenshot_path, url, live_seconds, write_status)
+                    finally:
+                        try:
+                            await page.close()
+                        except Exception:
+                            pass
+                write_status({'status': 'finished', 'screenshot': str(screenshot_path)})
+                return
+            except Exception as e:
+                write_status({'status': 'error', 'error': str(e)})
+                return
 
-    # Fallback to playwright
-    if HAVE_PLAYWRIGHT:
-        try:
-            async with async_playwright() as p:
-                launch_kwargs = {"headless": True}
-                # pass proxy settings to playwright launch if provided
-                if proxy:
-                    # playwright expects proxy dict with server, username, password
-                    launch_kwargs['proxy'] = {
-                        'server': proxy.get('server')
-                    }
-                    if proxy.get('username'):
-                        launch_kwargs['proxy']['username'] = proxy.get('username')
-                    if proxy.get('password'):
-                        launch_kwargs['proxy']['password'] = proxy.get('password')
-                # add common args for containerized env
-                launch_kwargs.setdefault('args', ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage'])
-                browser = await p.chromium.launch(**launch_kwargs)
-                context = await browser.new_context(accept_downloads=True)
-                page = await context.new_page()
-                await page.goto(url)
-                await asyncio.sleep(2)
-                try:
-                    await page.screenshot(path=str(screenshot_path))
-                except TypeError:
-                    # some wrappers may return bytes
-                    data = await page.screenshot()
-                    if isinstance(data, (bytes, bytearray)):
-                        with open(screenshot_path, 'wb') as f:
-                            f.write(data)
-                await browser.close()
+        # Fallback to playwright
+        if HAVE_PLAYWRIGHT:
+            try:
+                if profile_dir is not None:
+                    contexts = use_profile_context(profile_id, profile_dir, proxy_key)
+                elif session_dir is not None:
+                    contexts = session_context(session_dir, proxy_key)
+                else:
+                    contexts = _shared_context(proxy_key)
+                async with contexts as context:
+                    page = await context.new_page()
+                    try:
+                        await page.goto(url)
+                        await asyncio.sleep(2)
+                        await _live_view(page, outdir, screenshot_path, url, live_seconds, write_status)
+                    finally:
+                        await page.close()
                 write_status({'status': 'finished', 'screenshot': str(screenshot_path)})
                 return
+            except Exception as e:
+                write_status({'status': 'error', 'error': str(e)})
+                return
+
+    write_status({'status': 'error', 'error': 'no browser backend available'})
+
+
+async def _run_browser_batch(tasks: List[str], outdirs: List[Path], proxy: Optional[Dict[str, Any]]):
+    """Run several tasks as tabs of one browser context, at most BATCH_TABS at a time."""
+    if not HAVE_PLAYWRIGHT:
+        await asyncio.gather(*[_run_browser_task(t, o, None, proxy) for t, o in zip(tasks, outdirs)])
+        return
+
+    def write_status(outdir: Path, s: Dict[str, Any]):
+        try:
+            _write_status(outdir, s)
+        except Exception:
+            pass
+
+    for outdir in outdirs:
+        write_status(outdir, {'status': 'waiting_for_slot'})
+    # the whole batch shares one browser slot
+    async with BROWSER_SEM:
+        try:
+            browser = await get_browser()
+            context = await browser.new_context(proxy=_playwright_proxy(_proxy_key(proxy)), accept_downloads=True)
         except Exception as e:
-            write_status({'status': 'error', 'error': str(e)})
+            for outdir in outdirs:
+                write_status(outdir, {'status': 'error', 'error': str(e)})
             return
+        tabs = asyncio.Semaphore(BATCH_TABS)
 
-    write_status({'status': 'error', 'error': 'no browser backend available'})
+        async def _do(task: str, outdir: Path):
+            url = _target_url(task)
+            async with tabs:
+                write_status(outdir, {'status': 'launching_browser', 'target_url': url})
+                screenshot_path = outdir / SCREENSHOT_NAME
+                try:
+                    page = await context.new_page()
+                    try:
+                        await page.goto(url)
+                        await asyncio.sleep(2)
+                        await _capture(page, screenshot_path)
+                    finally:
+                        await page.close()
+                    write_status(outdir, {'status': 'finished', 'screenshot': str(screenshot_path)})
+                except Exception as e:
+                    write_status(outdir, {'status': 'error', 'error': str(e)})
+
+        try:
+            await asyncio.gather(*[_do(t, o) for t, o in zip(tasks, outdirs)])
+        finally:
+            await context.close()
+
+
+def queue_limit() -> anyio.CapacityLimiter:
+    # created on first use, inside the running event loop
+    global _queue_limit
+    if _queue_limit is None:
+        _queue_limit = anyio.CapacityLimiter(QUEUE_LIMIT)
+    return _queue_limit
+
+
+def session_limit() -> anyio.CapacityLimiter:
+    global _session_limit
+    if _session_limit is None:
+        _session_limit = anyio.CapacityLimiter(MAX_SESSIONS)
+    return _session_limit
+
+
+def _reserve_slot(owner: str, sessions: bool = False):
+    """Claim a queue slot for a run/session, or reject with 429 when saturated."""
+    if CELERY_BROKER_URL:
+        # the broker queues the work and worker concurrency bounds it
+        return
+    limiter = session_limit() if sessions else queue_limit()
+    try:
+        limiter.acquire_on_behalf_of_nowait(owner)
+    except anyio.WouldBlock:
+        detail = 'too many live sessions' if sessions else 'too many queued tasks'
+        raise HTTPException(status_code=429, detail=detail, headers={'Retry-After': '2'})
+
+
+async def _run_queued(limiter: anyio.CapacityLimiter, owner: str, func, *args):
+    try:
+        await func(*args)
+    finally:
+        limiter.release_on_behalf_of(owner)
+
+
+def _dispatch(background: BackgroundTasks, task: str, outdir: Path, profile_id: Optional[str], proxy: Optional[Dict[str, Any]], inflight_key: Optional[str] = None, live_seconds: int = 0):
+    if CELERY_BROKER_URL:
+        from tasks import run_browser_task, run_browser_session
+        if live_seconds:
+            run_browser_session.delay(task, str(outdir), profile_id, proxy, live_seconds)
+        else:
+            run_browser_task.delay(task, str(outdir), profile_id, proxy)
+    else:
+        # the slot was reserved under outdir.name by _reserve_slot
+        limiter = session_limit() if live_seconds else queue_limit()
+        background.add_task(_run_queued, limiter, outdir.name, _run_browser_task, task, outdir, profile_id, proxy, inflight_key, live_seconds)
+
+
+def _run_done(run_id: str) -> bool:
+    # checked on disk so runs finished by a Celery worker are released too
+    try:
+        return orjson.loads((RUNS_DIR / run_id / 'status.json').read_bytes()).get('status') in TERMINAL_STATES
+    except Exception:
+        return True
+
+
+def _sweep_inflight():
+    global _inflight_sweep_at
+    for key, run_id in list(INFLIGHT.items()):
+        if _run_done(run_id):
+            del INFLIGHT[key]
+    # next sweep once the map has doubled, so a long queue of live runs
+    # isn't rescanned on every request
+    _inflight_sweep_at = max(INFLIGHT_SWEEP_AT, 2 * len(INFLIGHT))
 
 
 @app.post("/run-task")
 async def run_task(req: Request, body: RunTaskRequest, background: BackgroundTasks):
     check_auth(req)
-    run_id = uuid.uuid4().hex
-    outdir = RUNS_DIR / run_id
-    outdir.mkdir(parents=True, exist_ok=True)
-    # write initial status
-    with open(outdir / 'status.json', 'w', encoding='utf-8') as f:
-        json.dump({'status': 'queued', 'task': body.task}, f)
+    key = req.headers.get('Idempotency-Key')
+    if not key:
+        key = blake2b(f"{body.task}|{body.profile_id}|{body.proxy}".encode(), digest_size=16).hexdigest()
+
+    async with _INFLIGHT_LOCK:
+        run_id = INFLIGHT.get(key)
+        if run_id:
+            if not _run_done(run_id):
+                # same task already queued or running; hand back that run
+                return JSONResponse({
+                    'run_id': run_id,
+                    'status_url': f"/runs/{run_id}/status",
+                    'screenshot_url': f"/runs/{run_id}/screenshot"
+                })
+            del INFLIGHT[key]
+        run_id = uuid.uuid4().hex
+        _reserve_slot(run_id)
+        outdir = RUNS_DIR / run_id
+        outdir.mkdir(parents=True, exist_ok=True)
+        # write initial status
+        _write_status(outdir, {'status': 'queued', 'task': body.task})
+        INFLIGHT[key] = run_id
+        if len(INFLIGHT) > _inflight_sweep_at:
+            _sweep_inflight()
 
     proxy_dict = None
     if body.proxy:
         proxy_dict = body.proxy.dict()
 
     # schedule background task
-    background.add_task(_run_browser_task, body.task, outdir, body.profile_id, proxy_dict)
+    _dispatch(background, body.task, outdir, body.profile_id, proxy_dict, key)
 
     return JSONResponse({
         'run_id': run_id,
@@ -233,23 +903,85 @@ async def run_task(req: Request, body: RunTaskRequest, background: BackgroundTas
     })
 
 
+def _file_response(path: str, media_type: str) -> Optional[Response]:
+    # one stat instead of exists() + FileResponse's own stat
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if ACCEL_REDIRECT_PREFIX:
+        # let the fronting nginx send the file with sendfile(2)
+        return Response(media_type=media_type, headers={'X-Accel-Redirect': f"{ACCEL_REDIRECT_PREFIX}/{path}"})
+    return FileResponse(path, media_type=media_type, stat_result=st)
+
+
+@app.post("/run-tasks")
+async def run_tasks(req: Request, body: BatchRequest, background: BackgroundTasks):
+    check_auth(req)
+    if not body.tasks:
+        raise HTTPException(status_code=400, detail='no tasks given')
+    if len(body.tasks) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f'at most {MAX_BATCH} tasks per batch')
+    batch_id = uuid.uuid4().hex
+    _reserve_slot(batch_id)
+    run_ids = [uuid.uuid4().hex for _ in body.tasks]
+    outdirs = []
+    for run_id, task in zip(run_ids, body.tasks):
+        outdir = RUNS_DIR / run_id
+        outdir.mkdir(parents=True, exist_ok=True)
+        _write_status(outdir, {'status': 'queued', 'task': task, 'batch_id': batch_id})
+        outdirs.append(outdir)
+
+    proxy_dict = body.proxy.dict() if body.proxy else None
+    if CELERY_BROKER_URL:
+        from tasks import run_browser_batch
+        run_browser_batch.delay(body.tasks, [str(o) for o in outdirs], proxy_dict)
+    else:
+        background.add_task(_run_queued, queue_limit(), batch_id, _run_browser_batch, body.tasks, outdirs, proxy_dict)
+
+    return JSONResponse({
+        'batch_id': batch_id,
+        'runs': [{
+            'run_id': run_id,
+            'status_url': f"/runs/{run_id}/status",
+            'screenshot_url': f"/runs/{run_id}/screenshot"
+        } for run_id in run_ids],
+    })
+
+
+@app.get('/metrics')
+async def metrics():
+    limiter = queue_limit()
+    return JSONResponse({
+        'queued': limiter.borrowed_tokens,
+        'queue_limit': limiter.total_tokens,
+        'inflight_runs': len(INFLIGHT),
+        'max_browsers': MAX_BROWSERS,
+        'sessions': session_limit().borrowed_tokens,
+        'max_sessions': MAX_SESSIONS,
+    })
+
+
 @app.get('/runs/{run_id}/status')
-def run_status(run_id: str):
-    sf = RUNS_DIR / run_id / 'status.json'
-    if sf.exists():
-        try:
-            return JSONResponse(json.loads(open(sf, 'r', encoding='utf-8').read()))
-        except Exception:
-            raise HTTPException(status_code=500, detail='status read error')
-    raise HTTPException(status_code=404, detail='run not found')
+async def run_status(run_id: str):
+    sf = f"{RUNS_DIR}/{run_id}/status.json"
+    try:
+        # the file is already JSON, serve it as-is
+        async with aiofiles.open(sf, 'rb') as f:
+            data = await f.read()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail='run not found')
+    except Exception:
+        raise HTTPException(status_code=500, detail='status read error')
+    return Response(data, media_type='application/json')
 
 
 @app.get('/runs/{run_id}/screenshot')
 def run_screenshot(run_id: str):
-    p = RUNS_DIR / run_id / 'screenshot.png'
-    if p.exists():
-        return FileResponse(str(p), media_type='image/png')
-    raise HTTPException(status_code=404, detail='screenshot not found')
+    resp = _file_response(f"{RUNS_DIR}/{run_id}/{SCREENSHOT_NAME}", 'image/jpeg')
+    if resp is None:
+        raise HTTPException(status_code=404, detail='screenshot not found')
+    return resp
 
 
 # Sessions endpoints (human-in-the-loop)
@@ -258,87 +990,239 @@ def run_screenshot(run_id: str):
 async def create_session(req: Request, background: BackgroundTasks, profile_id: Optional[str] = None, proxy: Optional[ProxyModel] = None):
     check_auth(req)
     sid = uuid.uuid4().hex
+    _reserve_slot(sid, sessions=True)
     sdir = SESSIONS_DIR / sid
     sdir.mkdir(parents=True, exist_ok=True)
     # spawn a background headless session that saves screenshots for live view
     task_text = profile_id or 'interactive-session'
     proxy_dict = proxy.dict() if proxy else None
-    background.add_task(_run_browser_task, task_text, sdir, profile_id, proxy_dict)
+    _dispatch(background, task_text, sdir, profile_id, proxy_dict, live_seconds=SESSION_LIVE_SECONDS)
     base = str(req.base_url).rstrip('/')
     live_url = f"{base}/sessions/{sid}/live"
     return JSONResponse({'session_id': sid, 'liveViewUrl': live_url})
 
 
 @app.get('/sessions/{sid}/live')
-def session_live(sid: str):
-    p = SESSIONS_DIR / sid / 'screenshot.png'
-    if p.exists():
-        return FileResponse(str(p), media_type='image/png')
+async def session_live(sid: str):
+    resp = _file_response(f"{SESSIONS_DIR}/{sid}/{SCREENSHOT_NAME}", 'image/jpeg')
+    if resp is not None:
+        return resp
     # show a small JSON status if screenshot missing
-    sf = SESSIONS_DIR / sid / 'status.json'
-    if sf.exists():
-        try:
-            return JSONResponse(json.loads(open(sf, 'r', encoding='utf-8').read()))
-        except Exception:
-            pass
+    try:
+        async with aiofiles.open(f"{SESSIONS_DIR}/{sid}/status.json", 'rb') as f:
+            data = await f.read()
+        return Response(data, media_type='application/json')
+    except Exception:
+        pass
     raise HTTPException(status_code=404, detail='session not ready')
 
 
+def _copy_file(src: str, dst: str):
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        try:
+            # copy inside the kernel where supported (Linux 4.5+)
+            copied = 0
+            while copied < size:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return
+        except (AttributeError, OSError):
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def fast_copytree(src: str, dst: str):
+    """Copy a directory tree using scandir's cached entry types, keeping symlinks as links."""
+    os.makedirs(dst, exist_ok=True)
+    with os.scandir(src) as it:
+        for entry in it:
+            target = os.path.join(dst, entry.name)
+            if entry.is_symlink():
+                os.symlink(os.readlink(entry.path), target)
+            elif entry.is_dir():
+                fast_copytree(entry.path, target)
+            else:
+                _copy_file(entry.path, target)
+
+
+def _session_done(sdir: Path) -> bool:
+    try:
+        return orjson.loads((sdir / 'status.json').read_bytes()).get('status') in TERMINAL_STATES
+    except Exception:
+        return False
+
+
 @app.post('/sessions/{sid}/complete')
-def complete_session(sid: str, req: Request, body: Optional[Dict[str, Any]] = None):
+async def complete_session(sid: str, req: Request, body: Optional[Dict[str, Any]] = None):
     check_auth(req)
     sdir = SESSIONS_DIR / sid
     if not sdir.exists():
         raise HTTPException(status_code=404, detail='session not found')
+    # stops the live-view loop; the browser then closes and flushes the
+    # session's user data dir, so wait for that before copying it
+    (sdir / 'completed').touch()
+    deadline = time.monotonic() + SESSION_CLOSE_TIMEOUT
+    while not _session_done(sdir):
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail='session is still closing', headers={'Retry-After': '2'})
+        await asyncio.sleep(0.2)
     profile_id = uuid.uuid4().hex
     target = PROFILES_DIR / profile_id
-    try:
-        shutil.copytree(sdir / 'profile', target)
-    except Exception:
-        # if no profile dir exists, create empty profile
+    src = sdir / 'profile'
+    if not src.is_dir():
+        # sessions on a saved profile write to that profile instead
         target.mkdir(parents=True, exist_ok=True)
+        return JSONResponse({'profile_id': profile_id})
+    try:
+        await anyio.to_thread.run_sync(fast_copytree, str(src), str(target))
+    except Exception as e:
+        await anyio.to_thread.run_sync(shutil.rmtree, target, True)
+        raise HTTPException(status_code=500, detail=f'failed to save profile: {e}')
     return JSONResponse({'profile_id': profile_id})
 
 
 # Profiles endpoints (retrieve and delete saved profiles)
 
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStream:
+    """Write-only, non-seekable sink that hands zipfile output back in chunks."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def pop(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_profile_zip(pdir: Path):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for root, _dirs, files in os.walk(pdir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    info = zipfile.ZipInfo.from_file(path, os.path.relpath(path, pdir))
+                    src = open(path, 'rb')
+                except OSError:
+                    # dangling lock symlinks, files removed mid-walk
+                    continue
+                with src, zf.open(info, 'w', force_zip64=True) as dst:
+                    while True:
+                        chunk = src.read(ZIP_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        data = stream.pop()
+                        if data:
+                            yield data
+                data = stream.pop()
+                if data:
+                    yield data
+    # central directory
+    yield stream.pop()
+
+
+async def _release_profile(profile_id: str) -> asyncio.Lock:
+    """Close any warm browser on the profile and return its launch lock, held.
+
+    Raises 409 while a task is using the profile; the caller releases the lock
+    once it is done with the files.
+    """
+    lock_key = _dir_key(PROFILES_DIR / profile_id)
+    lock = _launch_lock(lock_key)
+    await lock.acquire()
+    try:
+        async with _POOL_LOCK:
+            bu_keys = [key for key in BU_POOL if key[1] == lock_key[1]]
+            if PROFILE_ACTIVE.get(profile_id) or any(BU_ACTIVE.get(key) for key in bu_keys):
+                raise HTTPException(status_code=409, detail='profile is in use')
+            closers = [BU_POOL.pop(key).stop for key in bu_keys]
+            entry = PROFILE_CTX.pop(profile_id, None)
+            if entry is not None:
+                closers.append(entry[0].close)
+        for closer in closers:
+            try:
+                await closer()
+            except Exception:
+                pass
+        await _wait_closed(lock_key)
+    except BaseException:
+        lock.release()
+        raise
+    return lock
+
+
+async def _unlock(lock: asyncio.Lock):
+    lock.release()
+
+
 @app.get('/profiles/{profile_id}')
-def get_profile(profile_id: str, req: Request):
+async def get_profile(profile_id: str, req: Request):
     check_auth(req)
     pdir = PROFILES_DIR / profile_id
     if not pdir.exists() or not pdir.is_dir():
         raise HTTPException(status_code=404, detail='profile not found')
-    # Create a ZIP of the profile directory and return it
-    zip_base = PROFILES_DIR / f"{profile_id}"
-    zip_path = PROFILES_DIR / f"{profile_id}.zip"
-    try:
-        # remove existing zip if present
-        if zip_path.exists():
-            zip_path.unlink()
-        shutil.make_archive(str(zip_base), 'zip', root_dir=str(pdir))
-        return FileResponse(str(zip_path), media_type='application/zip', filename=f'profile_{profile_id}.zip')
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f'failed to create zip: {e}')
+    # the lock keeps tasks from reopening the profile until the zip is sent
+    lock = await _release_profile(profile_id)
+    # Stream an uncompressed ZIP of the profile directory; profile data is
+    # mostly already-compressed blobs, so deflate costs CPU for little gain
+    return StreamingResponse(
+        _iter_profile_zip(pdir),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="profile_{profile_id}.zip"'},
+        background=BackgroundTask(_unlock, lock),
+    )
 
 
 @app.delete('/profiles/{profile_id}')
-def delete_profile(profile_id: str, req: Request):
+async def delete_profile(profile_id: str, req: Request):
     check_auth(req)
     pdir = PROFILES_DIR / profile_id
     if not pdir.exists() or not pdir.is_dir():
         raise HTTPException(status_code=404, detail='profile not found')
+    lock = await _release_profile(profile_id)
     try:
-        shutil.rmtree(pdir)
-        # also remove any zip file
-        z = PROFILES_DIR / f"{profile_id}.zip"
-        if z.exists():
-            z.unlink()
+        await anyio.to_thread.run_sync(shutil.rmtree, pdir)
         return JSONResponse({'deleted': profile_id})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'failed to delete profile: {e}')
+    finally:
+        lock.release()
 
 
 if __name__ == '__main__':
     import uvicorn
-    port = int(os.getenv('PORT', '8000'))
-    uvicorn.run('main:app', host='0.0.0.0', port=port, log_level='info')
+    # in-process mode keeps the browser pool and in-flight runs in one worker;
+    # with Celery the API process only enqueues, so it can fan out
+    default_workers = (os.cpu_count() or 2) if CELERY_BROKER_URL else 1
+    uvicorn.run(
+        'main:app',
+        host='0.0.0.0',
+        port=settings().port,
+        workers=settings().workers or default_workers,
+        loop='uvloop',
+        http='httptools',
+        access_log=False,
+        log_level='info',
+    )
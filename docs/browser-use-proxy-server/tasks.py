@@ -0,0 +1,64 @@
+import asyncio
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from main import HAVE_PLAYWRIGHT, settings, _run_browser_task, _run_browser_batch, _close_pool, get_browser
+
+celery = Celery('bridge', broker=settings().celery_broker_url or 'redis://localhost:6379/0')
+# browser jobs only go to workers that have Chromium installed
+celery.conf.task_routes = {
+    'tasks.run_browser_task': {'queue': 'browser_queue'},
+    'tasks.run_browser_batch': {'queue': 'browser_queue'},
+    # live sessions hold a worker process for their whole live view, so they
+    # get their own workers and never starve browser_queue
+    'tasks.run_browser_session': {'queue': 'session_queue'},
+}
+celery.conf.task_acks_late = True
+celery.conf.worker_prefetch_multiplier = 1
+
+# One event loop per worker process: the pooled browser is bound to the loop it
+# was started on, so asyncio.run() per task would tear it down every time.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+@celery.task
+def run_browser_task(task: str, outdir: str, profile_id: Optional[str], proxy: Optional[Dict[str, Any]], live_seconds: int = 0):
+    _get_loop().run_until_complete(_run_browser_task(task, Path(outdir), profile_id, proxy, live_seconds=live_seconds))
+
+
+@celery.task
+def run_browser_session(task: str, outdir: str, profile_id: Optional[str], proxy: Optional[Dict[str, Any]], live_seconds: int):
+    _get_loop().run_until_complete(_run_browser_task(task, Path(outdir), profile_id, proxy, live_seconds=live_seconds))
+
+
+@celery.task
+def run_browser_batch(tasks: List[str], outdirs: List[str], proxy: Optional[Dict[str, Any]]):
+    _get_loop().run_until_complete(_run_browser_batch(tasks, [Path(o) for o in outdirs], proxy))
+
+
+@worker_process_init.connect
+def _warm(**kwargs):
+    if not HAVE_PLAYWRIGHT:
+        return
+    try:
+        _get_loop().run_until_complete(get_browser())
+    except Exception:
+        # tasks retry the launch and report the error in their status
+        pass
+
+
+@worker_process_shutdown.connect
+def _shutdown(**kwargs):
+    if _loop is not None:
+        _loop.run_until_complete(_close_pool())